@@ -15,11 +15,14 @@ def upgrade():
         sa.Column('tag', sa.String(length=128), nullable=False),
         sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()')),
     )
-    op.create_index('ix_document_tags_document_id', 'document_tags', ['document_id'])
-    op.create_index('ix_document_tags_tag', 'document_tags', ['tag'])
+    # CONCURRENTLY can't run inside a transaction; build without locking out writes
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY ix_document_tags_document_id ON document_tags (document_id)")
+        op.execute("CREATE INDEX CONCURRENTLY ix_document_tags_tag ON document_tags (tag)")
 
 def downgrade():
-    op.drop_index('ix_document_tags_tag', table_name='document_tags')
-    op.drop_index('ix_document_tags_document_id', table_name='document_tags')
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_tags_tag")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_document_tags_document_id")
     op.drop_table('document_tags')
     op.drop_column('documents', 'summary')
@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_chunk_indexes'
+down_revision = '0003_tags_and_summary'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Leading document_id column also serves plain chunks-by-document lookups and counts.
+    # Built CONCURRENTLY (outside a transaction) so ingestion keeps writing meanwhile.
+    with op.get_context().autocommit_block():
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY ix_chunks_doc_idx ON chunks (document_id, chunk_index)")
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_doc_idx")
@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_pending_embed_index'
+down_revision = '0004_chunk_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Column is used by the embedding job but was never added by a migration
+    op.execute("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS embedding_vector_id INTEGER")
+    # Partial index stays small: rows drop out of it as soon as they are embedded
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY ix_chunks_pending_embed ON chunks (document_id, id) "
+            "WHERE embedding_vector_id IS NULL"
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_chunks_pending_embed")
@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006_document_column_sizes'
+down_revision = '0005_pending_embed_index'
+branch_labels = None
+depends_on = None
+
+STATUSES = "('uploaded', 'parsed', 'parsed_empty', 'error')"
+
+def upgrade():
+    op.alter_column('documents', 'filename', type_=sa.String(length=512), existing_nullable=False)
+    op.alter_column('documents', 'mime', type_=sa.String(length=128), existing_nullable=False)
+    op.alter_column('documents', 'status', type_=sa.String(length=16), existing_nullable=False)
+    # NOT VALID here, then validate after the ALTERs above have committed: the existing-row
+    # scan runs under VALIDATE's SHARE UPDATE EXCLUSIVE lock instead of ACCESS EXCLUSIVE
+    op.execute(f"ALTER TABLE documents ADD CONSTRAINT ck_documents_status CHECK (status IN {STATUSES}) NOT VALID")
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE documents VALIDATE CONSTRAINT ck_documents_status")
+
+def downgrade():
+    op.drop_constraint('ck_documents_status', 'documents', type_='check')
+    op.alter_column('documents', 'status', type_=sa.String(), existing_nullable=False)
+    op.alter_column('documents', 'mime', type_=sa.String(), existing_nullable=False)
+    op.alter_column('documents', 'filename', type_=sa.String(), existing_nullable=False)
@@ -1,10 +1,31 @@
 # apps/api/llm.py
 import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
 import httpx
-from typing import List, Tuple
+from typing import AsyncIterator, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+REQUEST_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "20"))  # seconds per attempt
+MAX_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
+# Character budget for the context section (~75% of a 4096-token window at ~3 chars/token)
+MAX_CTX_CHARS = int(os.getenv("MAX_CTX_CHARS", str(int(3 * 4096 * 0.75))))
+NEAR_DUP_BITS = 8  # SimHash Hamming distance at or below which two contexts count as duplicates
+
+_WORD_RE = re.compile(r"\w+")
+
+# Long-lived client so every Ollama call reuses a kept-alive connection
+_client = httpx.AsyncClient(
+    base_url=OLLAMA_URL,
+    timeout=120,
+    limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=60),
+)
 
 SYSTEM_PROMPT = (
     "You are a careful assistant that answers ONLY using the provided context. "
@@ -12,10 +33,52 @@ SYSTEM_PROMPT = (
     "Be concise and accurate. Do not make up information not present in the context."
 )
 
+# Canned answers returned instead of model output; callers must not cache these
+EMPTY_ANSWER = "I apologize, but I couldn't generate a response. Please try rephrasing your question."
+UPSTREAM_ERROR_ANSWER = "I'm having trouble connecting to the language model. Please try again later."
+GENERIC_ERROR_ANSWER = "I encountered an error while generating the answer. Please try again."
+FALLBACK_ANSWERS = frozenset({EMPTY_ANSWER, UPSTREAM_ERROR_ANSWER, GENERIC_ERROR_ANSWER})
+
+class LLMTimeoutError(Exception):
+    """Raised when Ollama doesn't respond within the retry budget"""
+
+def _simhash(text: str) -> int:
+    """
+    64-bit SimHash over the words of the normalized text prefix;
+    near-identical passages differ in only a few bits
+    """
+    weights = [0] * 64
+    for word in _WORD_RE.findall(text[:512].lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def select_contexts(contexts: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Drop exact and near-duplicate contexts, then stop adding once MAX_CTX_CHARS is spent
+    Input order (best first) is preserved
+    """
+    kept, hashes, used = [], [], 0
+    for tag, text in contexts:
+        h = _simhash(text)
+        if any(bin(h ^ other).count("1") <= NEAR_DUP_BITS for other in hashes):
+            continue
+        if kept and used + len(text) > MAX_CTX_CHARS:
+            break
+        kept.append((tag, text))
+        hashes.append(h)
+        used += len(text)
+    
+    if len(kept) < len(contexts):
+        logger.debug("Kept %d/%d contexts (%d chars) after dedup and budget", len(kept), len(contexts), used)
+    return kept
+
 def build_prompt(question: str, contexts: List[Tuple[str, str]]) -> str:
     """
     Build a grounded prompt with context and citations
-    contexts: list[(tag, text)] where tag is like "Doc 4 #0"
+    contexts: list[(tag, text)] where tag is like "Doc 4 #0", already passed through
+    select_contexts (callers do that off the event loop)
     """
     if not contexts:
         return f"<system>\n{SYSTEM_PROMPT}\n</system>\n\n<user>\nQuestion: {question}\n\nNo context provided. Please say you don't have enough information.\n</user>"
@@ -41,70 +104,119 @@ Requirements:
     
     return prompt
 
+def build_payload(question: str, contexts: List[Tuple[str, str]], max_tokens: int, stream: bool) -> dict:
+    """
+    Build the Ollama /api/generate request body
+    """
+    return {
+        "model": OLLAMA_MODEL,
+        "prompt": build_prompt(question, contexts),
+        "stream": stream,
+        "options": {
+            "num_ctx": 4096,  # Context window
+            "num_predict": max_tokens,  # Max tokens to generate
+            "temperature": 0.1,  # Low temperature for more focused answers
+            "top_p": 0.9,
+            "repeat_penalty": 1.1
+        }
+    }
+
+async def _post_with_retry(path: str, payload: dict) -> httpx.Response:
+    """
+    POST to Ollama with a per-attempt timeout and exponential backoff,
+    so one stalled generation doesn't hold the request for the full client timeout
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await asyncio.wait_for(_client.post(path, json=payload), timeout=REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            if attempt == MAX_RETRIES:
+                break
+            backoff = 0.5 * 2 ** attempt
+            logger.warning("Ollama call timed out (attempt %d/%d), retrying in %.1fs", attempt + 1, MAX_RETRIES + 1, backoff)
+            await asyncio.sleep(backoff)
+    raise LLMTimeoutError(
+        f"Language model did not respond after {MAX_RETRIES + 1} attempts of {REQUEST_TIMEOUT:.0f}s each"
+    )
+
 async def generate_answer(question: str, contexts: List[Tuple[str, str]], max_tokens: int = 384) -> str:
     """
     Generate an answer using Ollama LLM with the provided context
+    Raises LLMTimeoutError when every attempt times out
     """
     try:
-        prompt = build_prompt(question, contexts)
+        payload = build_payload(question, contexts, max_tokens, stream=False)
         
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_ctx": 4096,  # Context window
-                "num_predict": max_tokens,  # Max tokens to generate
-                "temperature": 0.1,  # Low temperature for more focused answers
-                "top_p": 0.9,
-                "repeat_penalty": 1.1
-            }
-        }
+        logger.debug("Generating answer for: '%.50s...' using %d contexts", question, len(contexts))
         
-        print(f"Generating answer for: '{question[:50]}...' using {len(contexts)} contexts")
+        response = await _post_with_retry("/api/generate", payload)
+        response.raise_for_status()
+        data = response.json()
         
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.post(f"{OLLAMA_URL}/api/generate", json=payload)
-            response.raise_for_status()
-            data = response.json()
-            
-            answer = data.get("response", "").strip()
-            
-            if not answer:
-                return "I apologize, but I couldn't generate a response. Please try rephrasing your question."
-            
-            print(f"Generated answer length: {len(answer)} characters")
-            return answer
+        answer = data.get("response", "").strip()
+        
+        if not answer:
+            return EMPTY_ANSWER
+        
+        logger.debug("Generated answer length: %d characters", len(answer))
+        return answer
             
-    except httpx.TimeoutException:
-        return "I'm taking too long to respond. Please try a simpler question or try again later."
+    except LLMTimeoutError:
+        raise
     except httpx.HTTPStatusError as e:
-        print(f"HTTP error calling Ollama: {e}")
-        return "I'm having trouble connecting to the language model. Please try again later."
+        logger.error("HTTP error calling Ollama: %s", e)
+        return UPSTREAM_ERROR_ANSWER
     except Exception as e:
-        print(f"Error generating answer: {e}")
-        return "I encountered an error while generating the answer. Please try again."
+        logger.exception("Error generating answer: %s", e)
+        return GENERIC_ERROR_ANSWER
+
+async def generate_answer_stream(question: str, contexts: List[Tuple[str, str]], max_tokens: int = 384) -> AsyncIterator[str]:
+    """
+    Stream answer tokens from Ollama as they are generated (NDJSON)
+    Errors are propagated to the caller, which owns the response stream
+    """
+    payload = build_payload(question, contexts, max_tokens, stream=True)
+    
+    logger.debug("Streaming answer for: '%.50s...' using %d contexts", question, len(contexts))
+    
+    # Timeout applies per read, i.e. to the gap between streamed tokens
+    async with _client.stream("POST", "/api/generate", json=payload, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            token = data.get("response", "")
+            if token:
+                yield token
+            if data.get("done"):
+                break
 
 async def test_ollama_connection() -> bool:
     """
     Test if Ollama is accessible and the model is available
     """
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            # Test basic connection
-            response = await client.get(f"{OLLAMA_URL}/api/tags")
-            response.raise_for_status()
-            
-            models = response.json().get("models", [])
-            model_names = [model.get("name", "") for model in models]
+        # Test basic connection
+        response = await _client.get("/api/tags", timeout=30)
+        response.raise_for_status()
+        
+        models = response.json().get("models", [])
+        model_names = [model.get("name", "") for model in models]
+        
+        if OLLAMA_MODEL not in model_names:
+            logger.warning("Model '%s' not found. Available models: %s", OLLAMA_MODEL, model_names)
+            return False
             
-            if OLLAMA_MODEL not in model_names:
-                print(f"Warning: Model '{OLLAMA_MODEL}' not found. Available models: {model_names}")
-                return False
-                
-            print(f"Ollama connection successful. Model '{OLLAMA_MODEL}' is available.")
-            return True
+        logger.info("Ollama connection successful. Model '%s' is available.", OLLAMA_MODEL)
+        return True
             
     except Exception as e:
-        print(f"Ollama connection test failed: {e}")
+        logger.warning("Ollama connection test failed: %s", e)
         return False
+
+async def close_client() -> None:
+    """
+    Close the shared Ollama client (called on API shutdown)
+    """
+    await _client.aclose()
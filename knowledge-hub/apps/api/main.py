@@ -1,38 +1,131 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from redis import Redis
 from rq import Queue
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from typing import List, Optional
-import os, pathlib, uuid, re
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import Session, sessionmaker
+from cachetools import TTLCache
+from typing import Dict, List, Optional
+import os, pathlib, uuid, re, json, asyncio, hashlib, queue, logging, logging.handlers
+import aiofiles
 
 from packages.db.models import Base
 from packages.db.models import Document, Chunk, DocumentTag
+# Imported once at startup; FAISS/model files are loaded lazily by these modules
+from apps.api.retrieval import retrieve_topk, embed_query, search_index, get_index, get_model as get_embed_model
+from apps.api.rerank import rerank, RERANK_ENABLED, RERANK_CANDIDATES, RERANK_TOP_N, get_model as get_rerank_model
+from apps.api.llm import generate_answer, generate_answer_stream, select_contexts, close_client, LLMTimeoutError, FALLBACK_ANSWERS
 
 APP_VERSION = os.getenv("APP_VERSION", "0.1.0")
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:password@db:5432/knowledge_hub")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 STORAGE_DIR = os.getenv("STORAGE_DIR", "/data")
 MIN_SIM = float(os.getenv("MIN_SIM", "0.15"))  # threshold for low-confidence
+CONTEXT_CHARS = int(os.getenv("CONTEXT_CHARS", "800"))  # per-chunk characters sent to the LLM
+UPLOAD_CHUNK_SIZE = 1 << 16
+CITATION_RE = re.compile(r"\(Doc (\d+) #(\d+)\)")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "900"))  # seconds
+FILENAME_RE = re.compile(r"^[\w.\-]+\.(pdf|docx|txt)$", re.IGNORECASE)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Comma-separated list of origins allowed to call the API from a browser
+FRONTEND_ORIGINS = [o.strip() for o in os.getenv("FRONTEND_ORIGIN", "http://localhost:3000").split(",") if o.strip()]
 
 app = FastAPI(title="MCP Knowledge Hub API")
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"] ,
-    allow_headers=["*"],
+    allow_origins=FRONTEND_ORIGINS,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,  # let browsers reuse preflight results for a day
 )
 
 # DB session
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# LIFO checkout keeps the most recently used connections warm and lets idle ones expire
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=3600,
+    pool_use_lifo=True,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+def get_db():
+    """Request-scoped session dependency"""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
 # Queue
 redis = Redis.from_url(REDIS_URL)
 q = Queue("default", connection=redis)
 
+# Response caches keyed by a hash of the request; only touched from the event loop
+_qa_cache = TTLCache(maxsize=1024, ttl=RESULT_CACHE_TTL)
+# key -> [lock, number of requests holding or waiting on it]
+_qa_locks: Dict[bytes, list] = {}
+_search_cache = TTLCache(maxsize=1024, ttl=RESULT_CACHE_TTL)
+
+_warmup_task: Optional[asyncio.Task] = None
+
+def _cache_key(*parts) -> bytes:
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).digest()
+
+def _load_search():
+    get_embed_model()
+    try:
+        get_index()
+    except FileNotFoundError:
+        print("FAISS index not built yet; it will be loaded on first use")
+
+async def _warm_retrieval():
+    """
+    Load models and the FAISS index in the background so the first request doesn't pay for it
+    Requests don't wait for this: the loaders lock, so a request arriving mid-load waits only
+    for the piece it uses (/search never touches the reranker), and loads it itself if warm-up failed
+    """
+    try:
+        await run_in_threadpool(_load_search)
+        if RERANK_ENABLED:
+            await run_in_threadpool(get_rerank_model)
+    except Exception as e:
+        print(f"Retrieval warm-up failed: {e}")
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def _start_logging():
+    """
+    Route all log records through a queue so request handlers never block on stdout;
+    a listener thread does the actual writing
+    """
+    global _log_listener
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    _log_listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _log_listener.start()
+
+@app.on_event("startup")
+async def startup():
+    global _warmup_task
+    _start_logging()
+    _warmup_task = asyncio.create_task(_warm_retrieval())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_client()
+    if _log_listener is not None:
+        _log_listener.stop()
+
 class Health(BaseModel):
     status: str
     version: str
@@ -97,68 +190,81 @@ async def version():
     return {"version": APP_VERSION}
 
 @app.post("/documents")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), session: Session = Depends(get_db)):
     if not file.filename:
         raise HTTPException(400, "Missing filename")
+    if len(file.filename) > Document.filename.type.length:
+        raise HTTPException(400, f"Filename longer than {Document.filename.type.length} characters")
     ext = pathlib.Path(file.filename).suffix.lower()
     if ext not in [".pdf", ".docx", ".txt"]:
         raise HTTPException(415, "Only .pdf, .docx, .txt supported")
 
     # Persist metadata
-    session = SessionLocal()
-    try:
-        doc = Document(filename=file.filename, mime=file.content_type or "application/octet-stream", status="uploaded")
-        session.add(doc)
-        session.commit()
-        session.refresh(doc)
-        # Save file under /data/uploads/{doc_id}/filename
-        doc_dir = pathlib.Path(STORAGE_DIR) / "uploads" / str(doc.id)
-        doc_dir.mkdir(parents=True, exist_ok=True)
-        dst = doc_dir / file.filename
-        with open(dst, "wb") as f:
-            f.write(await file.read())
-        # queue job
-        q.enqueue("jobs.parse_document.run", document_id=doc.id, path=str(dst), storage_dir=STORAGE_DIR)
-        return {"status": "queued", "document_id": doc.id}
-    finally:
-        session.close()
+    mime = (file.content_type or "application/octet-stream")[:Document.mime.type.length]
+    doc_id = await run_in_threadpool(_create_document, session, file.filename, mime)
+    # Save file under /data/uploads/{doc_id}/filename
+    doc_dir = pathlib.Path(STORAGE_DIR) / "uploads" / str(doc_id)
+    doc_dir.mkdir(parents=True, exist_ok=True)
+    dst = doc_dir / file.filename
+    # Stream to disk in 64 KiB pieces so memory stays bounded for large uploads
+    async with aiofiles.open(dst, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+    # queue job
+    await run_in_threadpool(q.enqueue, "jobs.parse_document.run", document_id=doc_id, path=str(dst), storage_dir=STORAGE_DIR)
+    return {"status": "queued", "document_id": doc_id}
+
+def _create_document(session: Session, filename: str, mime: str) -> int:
+    doc = Document(filename=filename, mime=mime, status="uploaded")
+    session.add(doc)
+    session.commit()
+    session.refresh(doc)
+    return doc.id
 
 @app.get("/documents/{doc_id}", response_model=DocumentResponse)
-async def get_document(doc_id: int):
-    session = SessionLocal()
-    try:
-        doc = session.query(Document).get(doc_id)
-        if not doc:
-            raise HTTPException(404, "Not found")
-        
-        # Count chunks
-        chunk_count = session.query(Chunk).filter(Chunk.document_id == doc_id).count()
-        
-        # Get tags
-        tags = [t.tag for t in session.query(DocumentTag).filter(
-            DocumentTag.document_id == doc_id
-        ).order_by(DocumentTag.tag).all()]
-        
-        return DocumentResponse(
-            id=doc.id,
-            filename=doc.filename,
-            status=doc.status,
-            chunks=chunk_count,
-            tags=tags,
-            summary=doc.summary
-        )
-    finally:
-        session.close()
+def get_document(doc_id: int, session: Session = Depends(get_db)):
+    # Document columns and chunk count in one round-trip, as plain rows
+    doc = session.execute(
+        select(Document.id, Document.filename, Document.status, Document.summary, func.count(Chunk.id).label("chunks"))
+        .outerjoin(Chunk, Chunk.document_id == Document.id)
+        .where(Document.id == doc_id)
+        .group_by(Document.id)
+    ).first()
+    if not doc:
+        raise HTTPException(404, "Not found")
+
+    # Get tags
+    tags = list(session.execute(
+        select(DocumentTag.tag).where(DocumentTag.document_id == doc_id).order_by(DocumentTag.tag)
+    ).scalars())
+
+    return DocumentResponse(
+        id=doc.id,
+        filename=doc.filename,
+        status=doc.status,
+        chunks=doc.chunks,
+        tags=tags,
+        summary=doc.summary
+    )
 
 @app.post("/search", response_model=SearchResponse)
-async def search_documents(request: SearchRequest):
+async def search_documents(request: SearchRequest, response: Response, session: Session = Depends(get_db)):
     """Semantic search through document chunks using FAISS"""
+    key = _cache_key(request.query, request.k)
+    cached = _search_cache.get(key)
+    if cached is None:
+        cached = await run_in_threadpool(_search, session, request)
+        # Empty results aren't cached so newly embedded documents show up immediately
+        if cached.results:
+            _search_cache[key] = cached
+    if cached.results:
+        response.headers["Cache-Control"] = f"private, max-age={RESULT_CACHE_TTL}"
+    return cached
+
+def _search(session: Session, request: SearchRequest) -> SearchResponse:
     try:
-        # Import the search function from the embedding job
-        from packages.agents.jobs.embed_chunks import search_similar_chunks
-        
-        # Get similar chunk IDs and scores
-        similar_chunks = search_similar_chunks(request.query, request.k)
+        # Get similar chunk IDs and scores (query embedding shared with /qa)
+        similar_chunks = search_index(embed_query(request.query), request.k)
         
         if not similar_chunks:
             return SearchResponse(
@@ -168,43 +274,39 @@ async def search_documents(request: SearchRequest):
             )
         
         # Get chunk details from database
-        session = SessionLocal()
-        try:
-            chunk_ids = [chunk_id for chunk_id, _ in similar_chunks]
-            chunks = session.query(Chunk, Document).join(
-                Document, Chunk.document_id == Document.id
-            ).filter(Chunk.id.in_(chunk_ids)).all()
-            
-            # Create results with similarity scores
-            chunk_data = {chunk.id: (chunk, doc) for chunk, doc in chunks}
-            results = []
-            
-            for chunk_id, similarity_score in similar_chunks:
-                if chunk_id in chunk_data:
-                    chunk, doc = chunk_data[chunk_id]
-                    results.append(ChunkResult(
-                        id=chunk.id,
-                        text=chunk.text,
-                        chunk_index=chunk.chunk_index,
-                        document_id=chunk.document_id,
-                        filename=doc.filename,
-                        similarity_score=similarity_score
-                    ))
-            
-            return SearchResponse(
-                query=request.query,
-                results=results,
-                total_results=len(results)
+        score_by_id = dict(similar_chunks)
+        rows = session.execute(
+            select(Chunk.id, Chunk.text, Chunk.chunk_index, Chunk.document_id, Document.filename)
+            .join(Document, Chunk.document_id == Document.id)
+            .where(Chunk.id.in_(score_by_id))
+        ).all()
+
+        # Create results with similarity scores, keeping FAISS ranking order
+        row_by_id = {row.id: row for row in rows}
+        results = [
+            ChunkResult(
+                id=row.id,
+                text=row.text,
+                chunk_index=row.chunk_index,
+                document_id=row.document_id,
+                filename=row.filename,
+                similarity_score=score_by_id[row.id]
             )
-            
-        finally:
-            session.close()
+            for row in (row_by_id.get(chunk_id) for chunk_id, _ in similar_chunks)
+            if row is not None
+        ]
+
+        return SearchResponse(
+            query=request.query,
+            results=results,
+            total_results=len(results)
+        )
             
     except Exception as e:
         raise HTTPException(500, f"Search failed: {str(e)}")
 
 @app.post("/embed")
-async def trigger_embedding(document_id: Optional[int] = None):
+def trigger_embedding(document_id: Optional[int] = None):
     """Trigger embedding job for documents"""
     try:
         if document_id:
@@ -216,115 +318,255 @@ async def trigger_embedding(document_id: Optional[int] = None):
     except Exception as e:
         raise HTTPException(500, f"Failed to queue embedding job: {str(e)}")
 
+NO_RESULTS_ANSWER = "I don't have any relevant information to answer that question. Please try uploading some documents first or rephrase your question."
+LOW_CONFIDENCE_ANSWER = "I found some potentially relevant information, but it doesn't seem closely related enough to your question. Please try rephrasing or being more specific."
+
+def _build_contexts(session, results):
+    """Filter retrieval results by MIN_SIM and build tagged contexts for the LLM"""
+    tagged_contexts = []
+    valid_results = []
+    
+    results = [(chunk, score) for chunk, score in results if score >= MIN_SIM]
+    if not results:
+        return tagged_contexts, valid_results
+    
+    # Look up all referenced documents in one IN query instead of one per chunk
+    doc_ids = {chunk.document_id for chunk, _ in results}
+    known_docs = set(session.execute(select(Document.id).where(Document.id.in_(doc_ids))).scalars())
+    
+    for chunk, score in results:
+        if chunk.document_id in known_docs:
+            tag = f"Doc {chunk.document_id} #{chunk.chunk_index}"
+            # Keep contexts short to fit model context window
+            text = chunk.text[:CONTEXT_CHARS]
+            tagged_contexts.append((tag, text))
+            valid_results.append((chunk, score))
+    
+    return tagged_contexts, valid_results
+
+def _preview(text: str) -> str:
+    return text[:240] + "..." if len(text) > 240 else text
+
+def _build_hits(valid_results) -> List[ContextHit]:
+    """Prepare context hits for UI"""
+    return [
+        ContextHit(
+            document_id=chunk.document_id,
+            chunk_index=chunk.chunk_index,
+            score=float(score),
+            preview=_preview(chunk.text)
+        )
+        for chunk, score in valid_results[:6]  # Limit to top 6 for UI
+    ]
+
+def _extract_citations(answer: str) -> List[Citation]:
+    """Extract citations from answer using regex"""
+    # Single pass over the matches, skipping duplicates and keeping first-seen order
+    seen = set()
+    citations = []
+    for m in CITATION_RE.finditer(answer):
+        key = (int(m.group(1)), int(m.group(2)))
+        if key not in seen:
+            seen.add(key)
+            citations.append(Citation(document_id=key[0], chunk_index=key[1]))
+    return citations
+
+def _retrieve_contexts(session: Session, req: QARequest):
+    """
+    Blocking retrieval step shared by /qa and /qa/stream (FAISS search + DB lookups)
+    Closes the session when done: the request-scoped session is only torn down after the
+    response is sent, and the connection shouldn't sit idle in a transaction during generation
+    """
+    try:
+        if RERANK_ENABLED:
+            # Over-retrieve, then keep the req.k most answer-bearing passages (at most RERANK_TOP_N) for the prompt
+            results = retrieve_topk(session, req.query, k=max(req.k, RERANK_CANDIDATES))
+            results = rerank(req.query, results, top_n=min(req.k, RERANK_TOP_N))
+        else:
+            results = retrieve_topk(session, req.query, k=req.k)
+        tagged_contexts, valid_results = _build_contexts(session, results)
+        # Dedup and budget the prompt contexts here, in the threadpool, rather than in the LLM call
+        return bool(results), select_contexts(tagged_contexts), _build_hits(valid_results)
+    finally:
+        session.close()
+
+def _parse_literal_query(query: str):
+    """
+    Classify queries answerable by an exact metadata lookup
+    Returns (kind, value) for `tag:<label>`, a bare filename or a "quoted phrase", else None
+    """
+    q = query.strip()
+    if q[:4].lower() == "tag:":
+        value = q[4:].strip()
+        return ("tag", value) if value else None
+    if len(q) > 2 and q.startswith('"') and q.endswith('"'):
+        return ("phrase", q[1:-1].strip())
+    if FILENAME_RE.match(q):
+        return ("filename", q)
+    return None
+
+def _literal_lookup(session: Session, kind: str, value: str) -> Optional[QAResponse]:
+    """Answer a literal query from documents.filename / document_tags.tag without retrieval or the LLM"""
+    doc_ids = set()
+    if kind in ("filename", "phrase"):
+        doc_ids.update(session.execute(select(Document.id).where(Document.filename == value)).scalars())
+    if kind in ("tag", "phrase"):
+        doc_ids.update(session.execute(select(DocumentTag.document_id).where(DocumentTag.tag == value)).scalars())
+    if not doc_ids:
+        return None
+
+    first_chunks = session.execute(
+        select(Chunk.document_id, Chunk.text)
+        .where(Chunk.document_id.in_(sorted(doc_ids)[:6]), Chunk.chunk_index == 0)
+        .order_by(Chunk.document_id)
+    ).all()
+    
+    label = {"filename": "filename", "tag": "tag", "phrase": "filename or tag"}[kind]
+    return QAResponse(
+        answer=f"Exact match on {label}.",
+        citations=[Citation(document_id=row.document_id, chunk_index=0) for row in first_chunks],
+        hits=[
+            ContextHit(document_id=row.document_id, chunk_index=0, score=1.0, preview=_preview(row.text))
+            for row in first_chunks
+        ]
+    )
+
 @app.post("/qa", response_model=QAResponse)
-async def qa(req: QARequest):
+async def qa(req: QARequest, response: Response, session: Session = Depends(get_db)):
     """Question & Answer endpoint with citations"""
+    # Exact filename / tag lookups skip retrieval and the LLM entirely
+    literal = _parse_literal_query(req.query)
+    if literal:
+        result = await run_in_threadpool(_literal_lookup, session, *literal)
+        if result is not None:
+            return result
+    
+    key = _cache_key(req.query, req.k, req.max_tokens)
+    cached = _qa_cache.get(key)
+    if cached is None:
+        # One computation per key; identical concurrent questions wait for it
+        entry = _qa_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                cached = _qa_cache.get(key)
+                if cached is None:
+                    cached, cacheable = await _answer(session, req)
+                    if cacheable:
+                        _qa_cache[key] = cached
+        finally:
+            # Only the last user drops the entry, so a newcomer can't get a second lock for the key
+            entry[1] -= 1
+            if not entry[1]:
+                del _qa_locks[key]
+    if key in _qa_cache:
+        response.headers["Cache-Control"] = f"private, max-age={RESULT_CACHE_TTL}"
+    return cached
+
+async def _answer(session: Session, req: QARequest):
+    """
+    Run retrieval + generation for /qa
+    Returns (QAResponse, cacheable); only grounded model answers are cacheable
+    """
     try:
-        # Import here to avoid startup issues if FAISS files don't exist yet
-        from apps.api.retrieval import retrieve_topk
-        from apps.api.llm import generate_answer
+        # Retrieve relevant chunks off the event loop
+        found, tagged_contexts, hits = await run_in_threadpool(_retrieve_contexts, session, req)
+        
+        if not found:
+            return QAResponse(answer=NO_RESULTS_ANSWER, citations=[], hits=[]), False
         
-        session = SessionLocal()
+        if not tagged_contexts:
+            return QAResponse(answer=LOW_CONFIDENCE_ANSWER, citations=[], hits=[]), False
+        
+        # Generate answer using LLM
         try:
-            # Retrieve relevant chunks
-            results = retrieve_topk(session, req.query, k=req.k)
-            
-            if not results:
-                return QAResponse(
-                    answer="I don't have any relevant information to answer that question. Please try uploading some documents first or rephrase your question.",
-                    citations=[],
-                    hits=[]
-                )
-            
-            # Filter by similarity threshold and build tagged contexts
-            tagged_contexts = []
-            valid_results = []
-            
-            for chunk, score in results:
-                if score < MIN_SIM:
-                    continue
-                    
-                # Get document info for better context tags
-                document = session.query(Document).filter(Document.id == chunk.document_id).first()
-                if document:
-                    tag = f"Doc {chunk.document_id} #{chunk.chunk_index}"
-                    # Keep contexts short to fit model context window
-                    text = chunk.text[:1800] if len(chunk.text) > 1800 else chunk.text
-                    tagged_contexts.append((tag, text))
-                    valid_results.append((chunk, score, document))
-            
-            if not tagged_contexts:
-                return QAResponse(
-                    answer="I found some potentially relevant information, but it doesn't seem closely related enough to your question. Please try rephrasing or being more specific.",
-                    citations=[],
-                    hits=[]
-                )
-            
-            # Generate answer using LLM
             answer = await generate_answer(req.query, tagged_contexts, max_tokens=req.max_tokens)
-            
-            # Extract citations from answer using regex
-            citation_matches = re.findall(r"\(Doc (\d+) #(\d+)\)", answer)
-            citations = [
-                Citation(document_id=int(doc_id), chunk_index=int(chunk_idx))
-                for doc_id, chunk_idx in set(citation_matches)  # Remove duplicates
-            ]
-            
-            # Prepare context hits for UI
-            hits = [
-                ContextHit(
-                    document_id=chunk.document_id,
-                    chunk_index=chunk.chunk_index,
-                    score=float(score),
-                    preview=chunk.text[:240] + "..." if len(chunk.text) > 240 else chunk.text
-                )
-                for chunk, score, document in valid_results[:6]  # Limit to top 6 for UI
-            ]
-            
-            return QAResponse(
-                answer=answer,
-                citations=citations,
-                hits=hits
-            )
-            
-        finally:
-            session.close()
+        except LLMTimeoutError as e:
+            raise HTTPException(504, str(e))
+        
+        return QAResponse(
+            answer=answer,
+            citations=_extract_citations(answer),
+            hits=hits
+        ), answer not in FALLBACK_ANSWERS
             
     except FileNotFoundError as e:
         raise HTTPException(
             status_code=503, 
             detail="Embedding system not ready. Please ensure documents have been embedded first."
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in Q&A endpoint: {e}")
         raise HTTPException(500, f"Q&A failed: {str(e)}")
 
+@app.delete("/qa/cache")
+async def purge_result_cache():
+    """Drop all cached /qa and /search responses"""
+    _qa_cache.clear()
+    _search_cache.clear()
+    return {"status": "purged"}
+
+def _sse(event: str, data: dict) -> str:
+    """Format a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _qa_stream(req: QARequest, tagged_contexts, hits: List[ContextHit]):
+    """
+    Yield `token` events while Ollama generates, then a trailing `done` event
+    carrying the full QAResponse (answer, citations, hits)
+    """
+    parts = []
+    try:
+        async for token in generate_answer_stream(req.query, tagged_contexts, max_tokens=req.max_tokens):
+            parts.append(token)
+            yield _sse("token", {"text": token})
+    except Exception as e:
+        print(f"Error in streaming Q&A endpoint: {e}")
+        yield _sse("error", {"detail": "I encountered an error while generating the answer. Please try again."})
+        return
+    
+    answer = "".join(parts).strip()
+    response = QAResponse(answer=answer, citations=_extract_citations(answer), hits=hits)
+    yield _sse("done", response.model_dump())
+
+@app.post("/qa/stream")
+async def qa_stream(req: QARequest, session: Session = Depends(get_db)):
+    """Question & Answer endpoint streaming the answer as server-sent events"""
+    try:
+        found, tagged_contexts, hits = await run_in_threadpool(_retrieve_contexts, session, req)
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=503, 
+            detail="Embedding system not ready. Please ensure documents have been embedded first."
+        )
+    
+    if not tagged_contexts:
+        answer = LOW_CONFIDENCE_ANSWER if found else NO_RESULTS_ANSWER
+        done = QAResponse(answer=answer, citations=[], hits=[])
+        return StreamingResponse(iter([_sse("done", done.model_dump())]), media_type="text/event-stream")
+    
+    return StreamingResponse(_qa_stream(req, tagged_contexts, hits), media_type="text/event-stream")
+
 @app.post('/documents/{doc_id}/tag')
-async def trigger_tag(doc_id: int, req: TagRequest = TagRequest()):
+def trigger_tag(doc_id: int, req: TagRequest = TagRequest(), session: Session = Depends(get_db)):
     """Trigger auto-tagging for a document"""
-    session = SessionLocal()
-    try:
-        doc = session.query(Document).get(doc_id)
-        if not doc:
-            raise HTTPException(404, 'Document not found')
-        
-        # Queue the tagging job
-        q.enqueue('jobs.tag_document.run', document_id=doc_id)
-        return {'status': 'queued', 'document_id': doc_id, 'job': 'tag_document'}
-    finally:
-        session.close()
+    doc = session.get(Document, doc_id)
+    if not doc:
+        raise HTTPException(404, 'Document not found')
+
+    # Queue the tagging job
+    q.enqueue('jobs.tag_document.run', document_id=doc_id)
+    return {'status': 'queued', 'document_id': doc_id, 'job': 'tag_document'}
 
 @app.post('/documents/{doc_id}/summarize')
-async def trigger_summarize(doc_id: int, req: SummarizeRequest = SummarizeRequest()):
+def trigger_summarize(doc_id: int, req: SummarizeRequest = SummarizeRequest(), session: Session = Depends(get_db)):
     """Trigger summarization for a document"""
-    session = SessionLocal()
-    try:
-        doc = session.query(Document).get(doc_id)
-        if not doc:
-            raise HTTPException(404, 'Document not found')
-        
-        # Queue the summarization job
-        q.enqueue('jobs.summarize_document.run', document_id=doc_id)
-        return {'status': 'queued', 'document_id': doc_id, 'job': 'summarize_document'}
-    finally:
-        session.close()
+    doc = session.get(Document, doc_id)
+    if not doc:
+        raise HTTPException(404, 'Document not found')
+
+    # Queue the summarization job
+    q.enqueue('jobs.summarize_document.run', document_id=doc_id)
+    return {'status': 'queued', 'document_id': doc_id, 'job': 'summarize_document'}
@@ -0,0 +1,69 @@
+# apps/api/rerank.py
+import os
+import hashlib
+import threading
+from typing import List, Tuple
+from cachetools import TTLCache
+from sentence_transformers import CrossEncoder
+from packages.db.models import Chunk
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "1") == "1"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))  # dense hits fed to the reranker
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "8"))  # reranked hits fed to the LLM
+
+_model = None
+_model_lock = threading.Lock()
+# (query digest, chunk text digest) -> cross-encoder score
+_scores = TTLCache(maxsize=10_000, ttl=900)
+_scores_lock = threading.Lock()
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f"Loading rerank model: {RERANK_MODEL}")
+                _model = CrossEncoder(RERANK_MODEL, max_length=512)
+                print("Rerank model loaded successfully")
+    return _model
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+def rerank(query: str, candidates: List[Tuple[Chunk, float]], top_n: int = RERANK_TOP_N) -> List[Tuple[Chunk, float]]:
+    """
+    Reorder retrieval results by cross-encoder relevance
+    candidates: list[(chunk, score)] from retrieve_topk; the dense score is kept
+    so MIN_SIM filtering downstream still applies. Returns the top_n, best first.
+    """
+    if len(candidates) <= 1:
+        return candidates[:top_n]
+
+    try:
+        model = get_model()
+
+        q_key = _digest(query)
+        keys = [(q_key, _digest(chunk.text)) for chunk, _ in candidates]
+        with _scores_lock:
+            scores = [_scores.get(key) for key in keys]
+
+        # Only score pairs we haven't seen within the TTL
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            fresh = model.predict(
+                [(query, candidates[i][0].text) for i in missing],
+                batch_size=32,
+                show_progress_bar=False
+            )
+            with _scores_lock:
+                for i, score in zip(missing, fresh):
+                    scores[i] = float(score)
+                    _scores[keys[i]] = scores[i]
+
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+        return [candidates[i] for i in order[:top_n]]
+
+    except Exception as e:
+        print(f"Error in rerank, keeping dense order: {e}")
+        return candidates[:top_n]
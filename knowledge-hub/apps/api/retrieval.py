@@ -1,92 +1,191 @@
 # apps/api/retrieval.py
 import os
 import faiss
-import pickle
-import pathlib
+import hashlib
+import threading
 import numpy as np
+from typing import List, Tuple
+from cachetools import TTLCache
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sentence_transformers import SentenceTransformer
 from packages.db.models import Chunk
+from packages.agents.encoders import load_onnx_encoder
+from packages.agents.jobs.embed_chunks import configure_search, is_id_mapped, migrate_legacy_index
 
 MODEL_NAME = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "/data/faiss_index.idx")
-FAISS_MAPPING_PATH = os.getenv("FAISS_MAPPING_PATH", "/data/faiss_mapping.pkl")
+FAISS_MAPPING_PATH = os.getenv("FAISS_MAPPING_PATH", "/data/faiss_mapping.pkl")  # legacy indexes only
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))  # seconds
+FAISS_GPU = os.getenv("FAISS_GPU", "1") == "1"
 
 _model = None
+_model_lock = threading.Lock()
 _index = None
-_mapping = None
+_index_mtime = None
+_index_lock = threading.Lock()
+_gpu_resources = None  # one StandardGpuResources per process, reused across index reloads
+# Query embeddings shared by /search and /qa; guarded because callers run in the threadpool
+_query_cache = TTLCache(maxsize=4096, ttl=QUERY_CACHE_TTL)
+_query_cache_lock = threading.Lock()
 
 def get_model():
     global _model
     if _model is None:
-        print(f"Loading embedding model: {MODEL_NAME}")
-        _model = SentenceTransformer(MODEL_NAME)
-        print("Embedding model loaded successfully")
+        # Threadpool callers racing the startup warm-up wait here instead of loading a second copy
+        with _model_lock:
+            if _model is None:
+                print(f"Loading embedding model: {MODEL_NAME}")
+                # The INT8 ONNX export only covers the default model
+                _model = (MODEL_NAME == "all-MiniLM-L6-v2" and load_onnx_encoder()) or SentenceTransformer(MODEL_NAME)
+                print("Embedding model loaded successfully")
     return _model
 
 def get_index():
-    global _index
-    if _index is None:
-        index_path = pathlib.Path(FAISS_INDEX_PATH)
-        if index_path.exists():
-            print(f"Loading FAISS index from {FAISS_INDEX_PATH}")
-            _index = faiss.read_index(str(index_path))
-            print(f"FAISS index loaded with {_index.ntotal} vectors")
-        else:
+    """Return the FAISS index, reloading it after the worker atomically replaces the file"""
+    global _index, _index_mtime
+    try:
+        mtime = os.stat(FAISS_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        if _index is None:
             raise FileNotFoundError(f"FAISS index not found at {FAISS_INDEX_PATH}")
+        return _index
+    if _index is None or mtime != _index_mtime:
+        with _index_lock:
+            if _index is None or mtime != _index_mtime:
+                print(f"Loading FAISS index from {FAISS_INDEX_PATH}")
+                # Inverted lists are mapped rather than copied, so pages load lazily and
+                # are shared between API processes; the worker replaces the file atomically,
+                # so an existing mapping keeps pointing at the old, unchanged file
+                index = faiss.read_index(FAISS_INDEX_PATH, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                if not is_id_mapped(index):
+                    # Written before FAISS ids were chunk ids; the worker rewrites it on its next save
+                    index = migrate_legacy_index(index, FAISS_MAPPING_PATH)
+                _index = _to_gpu(configure_search(index))
+                _index_mtime = mtime
+                print(f"FAISS index loaded with {_index.ntotal} vectors")
     return _index
 
-def get_mapping():
-    global _mapping
-    if _mapping is None:
-        mapping_path = pathlib.Path(FAISS_MAPPING_PATH)
-        if mapping_path.exists():
-            with open(mapping_path, 'rb') as f:
-                _mapping = pickle.load(f)
-            print(f"FAISS mapping loaded with {len(_mapping)} entries")
-        else:
-            raise FileNotFoundError(f"FAISS mapping not found at {FAISS_MAPPING_PATH}")
-    return _mapping
+def _to_gpu(index):
+    """Move the index to GPU 0 when one is available; HNSW and other CPU-only types stay put"""
+    global _gpu_resources
+    if not FAISS_GPU or faiss.get_num_gpus() == 0:
+        return index
+    try:
+        if _gpu_resources is None:
+            _gpu_resources = faiss.StandardGpuResources()
+        # Search parameters (nprobe) are copied from the CPU index
+        gpu_index = faiss.index_cpu_to_gpu(_gpu_resources, 0, index)
+        print("FAISS index moved to GPU")
+        return gpu_index
+    except Exception as e:
+        print(f"FAISS index stays on CPU: {e}")
+        return index
 
-def retrieve_topk(session: Session, query: str, k: int = 5):
+def _query_key(query: str) -> bytes:
+    return hashlib.blake2b(query.encode(), digest_size=16).digest()
+
+def embed_query(query: str) -> np.ndarray:
     """
-    Retrieve top-k most similar chunks for a query
-    Returns list[(chunk, score)] with score in [0,1] cosine similarity
+    Encode a query as a (1, dim) float32 array, memoized by query hash
+    The array is shared between requests and must not be modified
+    """
+    key = _query_key(query)
+    with _query_cache_lock:
+        q_emb = _query_cache.get(key)
+    if q_emb is None:
+        # Encode query with same normalization as training
+        # Single contiguous float32 copy at most, which is what FAISS expects
+        q_emb = np.ascontiguousarray(
+            get_model().encode([query], output_value='sentence_embedding', convert_to_numpy=True, normalize_embeddings=True),
+            dtype=np.float32
+        )
+        with _query_cache_lock:
+            _query_cache[key] = q_emb
+    return q_emb
+
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """
+    Encode several queries as an (n, dim) float32 array
+    Cached queries are reused; the rest are encoded in one batch and cached
+    """
+    keys = [_query_key(q) for q in queries]
+    with _query_cache_lock:
+        rows = [_query_cache.get(key) for key in keys]
+    
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        fresh = np.ascontiguousarray(get_model().encode(
+            [queries[i] for i in missing],
+            batch_size=32,
+            output_value='sentence_embedding',
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ), dtype=np.float32)
+        with _query_cache_lock:
+            for i, vec in zip(missing, fresh):
+                rows[i] = vec[None, :]
+                _query_cache[keys[i]] = rows[i]
+    return np.vstack(rows)
+
+def search_index(q_emb: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
+    """
+    Search the FAISS index with a (1, dim) query embedding
+    Returns list[(chunk_id, score)], best first; empty when no index has been built yet
+    """
+    try:
+        index = get_index()
+    except FileNotFoundError:
+        return []
+    scores, indices = index.search(q_emb, k)
+    return [(int(chunk_id), float(score)) for score, chunk_id in zip(scores[0], indices[0]) if chunk_id != -1]
+
+def retrieve_topk_batch(session: Session, queries: List[str], k: int = 5) -> List[List[Tuple[Chunk, float]]]:
+    """
+    Retrieve top-k most similar chunks for each of several queries
+    One encode batch, one FAISS search and one DB query for the whole batch
+    Returns one list[(chunk, score)] per query, in query order
     """
     try:
-        model = get_model()
         index = get_index()
-        mapping = get_mapping()
         
-        # Encode query with same normalization as training
-        q_emb = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        q_emb = embed_queries(queries)
         
-        # Search FAISS index
-        scores, indices = index.search(q_emb.astype(np.float32), k)
+        # Search FAISS index; ids are chunk ids and -1 marks empty slots
+        scores, indices = index.search(q_emb, k)
+        per_query = [
+            {int(chunk_id): float(score) for score, chunk_id in zip(score_row, id_row) if chunk_id != -1}
+            for score_row, id_row in zip(scores, indices)
+        ]
+        unique_ids = set().union(*per_query)
+        if not unique_ids:
+            return [[] for _ in queries]
         
-        # Convert FAISS results to chunk objects
-        results = []
-        for score, faiss_idx in zip(scores[0], indices[0]):
-            if faiss_idx == -1:  # FAISS returns -1 for empty slots
-                continue
-                
-            # Map FAISS index to chunk ID
-            chunk_id = mapping.get(faiss_idx)
-            if chunk_id is None:
-                continue
-                
-            # Get chunk from database
-            chunk = session.query(Chunk).filter(Chunk.id == chunk_id).first()
-            if chunk is None:
-                continue
-                
-            # Normalize score (FAISS returns cosine similarity for normalized vectors)
-            normalized_score = float(score)
-            results.append((chunk, normalized_score))
+        # Fetch all hits in one query, then restore FAISS ranking order per query
+        # (scores are cosine similarity for normalized vectors)
+        chunk_by_id = {
+            chunk.id: chunk
+            for chunk in session.execute(select(Chunk).where(Chunk.id.in_(unique_ids))).scalars()
+        }
+        results = [
+            sorted(
+                ((chunk_by_id[chunk_id], score) for chunk_id, score in score_by_id.items() if chunk_id in chunk_by_id),
+                key=lambda r: r[1],
+                reverse=True
+            )
+            for score_by_id in per_query
+        ]
         
-        print(f"Retrieved {len(results)} chunks for query: '{query[:50]}...'")
+        print(f"Retrieved {sum(map(len, results))} chunks for {len(queries)} queries")
         return results
         
     except Exception as e:
-        print(f"Error in retrieve_topk: {e}")
-        return []
+        print(f"Error in retrieve_topk_batch: {e}")
+        return [[] for _ in queries]
+
+def retrieve_topk(session: Session, query: str, k: int = 5):
+    """
+    Retrieve top-k most similar chunks for a query
+    Returns list[(chunk, score)] with score in [0,1] cosine similarity
+    """
+    return retrieve_topk_batch(session, [query], k)[0]
@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# Tests import the app the way the containers do: `apps.api.*` and `packages.*` from the repo root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[3]))
@@ -0,0 +1,53 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from apps.api import main
+from packages.db.models import Base, Document, Chunk, DocumentTag
+
+@pytest.mark.parametrize("query, expected", [
+    ("tag:finance", ("tag", "finance")),
+    ("  TAG: finance ", ("tag", "finance")),
+    ("report-2024.pdf", ("filename", "report-2024.pdf")),
+    ('"Quarterly report"', ("phrase", "Quarterly report")),
+])
+def test_parse_literal_query(query, expected):
+    assert main._parse_literal_query(query) == expected
+
+@pytest.mark.parametrize("query", [
+    "tag:",
+    '""',
+    "notes.md",
+    "what does report.pdf say about revenue?",
+    "How do refunds work?",
+])
+def test_parse_literal_query_falls_through(query):
+    assert main._parse_literal_query(query) is None
+
+@pytest.fixture
+def session():
+    # In-memory SQLite shared across threads, since qa() runs the lookup in the threadpool
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as s:
+        s.add(Document(id=1, filename="report.pdf", status="parsed"))
+        s.add(Chunk(document_id=1, chunk_index=0, text="Quarterly revenue grew 12%.", token_count=6))
+        s.add(DocumentTag(document_id=1, tag="finance"))
+        s.commit()
+        yield s
+
+@pytest.mark.parametrize("query", ["tag:finance", "report.pdf", '"finance"'])
+def test_literal_hit_skips_retrieval_and_llm(session, query):
+    with mock.patch.object(main, "retrieve_topk") as retrieve, \
+         mock.patch.object(main, "generate_answer") as generate:
+        result = asyncio.run(main.qa(main.QARequest(query=query), Response(), session=session))
+
+    retrieve.assert_not_called()
+    generate.assert_not_called()
+    assert result.citations == [main.Citation(document_id=1, chunk_index=0)]
+    assert result.hits[0].preview == "Quarterly revenue grew 12%."
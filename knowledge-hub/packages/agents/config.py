@@ -34,14 +34,19 @@ class WorkerConfig:
     # OpenAI settings (for AI tasks)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     
+    _dict_cache = None
+    
     @classmethod
     def to_dict(cls) -> Dict[str, Any]:
-        """Convert configuration to dictionary"""
-        return {
-            attr: getattr(cls, attr) 
-            for attr in dir(cls) 
-            if not attr.startswith('_') and not callable(getattr(cls, attr))
-        }
+        """Convert configuration to dictionary (settings are read once, at import)"""
+        if cls.__dict__.get('_dict_cache') is None:
+            # Own attributes only; classmethod objects in vars() aren't callable, so exclude them explicitly
+            cls._dict_cache = {
+                attr: value
+                for attr, value in vars(cls).items()
+                if not attr.startswith('_') and not callable(value) and not isinstance(value, (classmethod, staticmethod))
+            }
+        return dict(cls._dict_cache)
     
     @classmethod
     def validate(cls) -> bool:
@@ -0,0 +1,89 @@
+"""
+ONNX Runtime (INT8) sentence encoder for CPU inference
+
+Produced once with `python -m packages.agents.export_onnx`; when the exported
+model is missing or onnxruntime isn't installed, callers fall back to
+SentenceTransformer.
+"""
+
+import os
+import pathlib
+from typing import List, Optional
+
+import numpy as np
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/data/models/all-MiniLM-L6-v2-onnx")
+ONNX_MODEL_FILE = "model-int8.onnx"
+EMBED_DIM = 384
+MAX_SEQ_LENGTH = 256  # same truncation as the SentenceTransformer config for all-MiniLM-L6-v2
+
+class OnnxSentenceEncoder:
+    """
+    Mean-pooled sentence embeddings from an exported transformer
+    encode() mirrors the subset of SentenceTransformer.encode used in this repo
+    """
+
+    def __init__(self, model_dir: str):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(pathlib.Path(model_dir) / ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 64,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        output_value: str = "sentence_embedding",
+    ) -> np.ndarray:
+        """Return a (n, dim) float32 array in input order (only sentence embeddings are supported)"""
+        # Longest first so each batch pads to similar lengths
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        out = [None] * len(sentences)
+
+        for start in range(0, len(sentences), batch_size):
+            idx = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [sentences[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feeds)[0]  # last_hidden_state: (b, seq, dim)
+
+            # Mean pooling over non-padding tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            for i, vec in zip(idx, pooled):
+                out[i] = vec
+
+        if not out:
+            return np.zeros((0, EMBED_DIM), dtype=np.float32)
+        return np.asarray(out, dtype=np.float32)
+
+def load_onnx_encoder(model_dir: str = ONNX_MODEL_DIR) -> Optional[OnnxSentenceEncoder]:
+    """Load the INT8 encoder if it has been exported and onnxruntime is available, else None"""
+    if not (pathlib.Path(model_dir) / ONNX_MODEL_FILE).exists():
+        return None
+    try:
+        encoder = OnnxSentenceEncoder(model_dir)
+    except ImportError as e:
+        print(f"ONNX model present but runtime unavailable ({e}); using SentenceTransformer")
+        return None
+    print(f"Loaded ONNX INT8 encoder from {model_dir}")
+    return encoder
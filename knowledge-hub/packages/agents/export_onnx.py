@@ -0,0 +1,36 @@
+"""
+One-time export of all-MiniLM-L6-v2 to ONNX with dynamic INT8 quantization
+
+Usage (from the repo root, with optimum[onnxruntime] installed):
+    python -m packages.agents.export_onnx [output_dir]
+
+The API and worker pick the model up from ONNX_MODEL_DIR on their next start.
+"""
+
+import pathlib
+import sys
+
+from packages.agents.encoders import ONNX_MODEL_DIR, ONNX_MODEL_FILE
+
+SOURCE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def export(output_dir: str = ONNX_MODEL_DIR) -> pathlib.Path:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+
+    out = pathlib.Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    print(f"Exporting {SOURCE_MODEL} to {out}...")
+    ORTModelForFeatureExtraction.from_pretrained(SOURCE_MODEL, export=True).save_pretrained(out)
+    AutoTokenizer.from_pretrained(SOURCE_MODEL).save_pretrained(out)
+
+    print("Quantizing weights to INT8...")
+    quantize_dynamic(str(out / "model.onnx"), str(out / ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    print(f"Wrote {out / ONNX_MODEL_FILE}")
+    return out / ONNX_MODEL_FILE
+
+if __name__ == "__main__":
+    export(*sys.argv[1:2])
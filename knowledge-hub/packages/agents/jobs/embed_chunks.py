@@ -1,66 +1,171 @@
 import os
+import fcntl
 import pickle
 import pathlib
+import contextlib
 import numpy as np
 from typing import List
 from sentence_transformers import SentenceTransformer
 import faiss
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import torch
+from sqlalchemy import select, update
+from packages.db.database import SessionLocal
 from packages.db.models import Document, Chunk
+from packages.agents.encoders import load_onnx_encoder
 
 # Global model and index (loaded once per worker)
 model = None
 faiss_index = None
+faiss_index_mtime = None  # mtime of the file faiss_index was loaded from / saved to
 FAISS_INDEX_PATH = "/data/faiss_index.idx"
 FAISS_MAPPING_PATH = "/data/faiss_mapping.pkl"
+EMBED_DIM = 384  # MiniLM output size
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "4096"))
+# Compressed index used once the corpus is large enough to train it
+FAISS_FACTORY = os.getenv("FAISS_FACTORY", f"OPQ32,IVF{FAISS_NLIST},PQ32")
+FAISS_TRAIN_MIN = 30 * FAISS_NLIST  # vectors needed before training the IVF quantizer
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+HNSW_M = 32
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+EMBED_BATCH = int(os.getenv("EMBED_BATCH", "64"))
+EMBED_STREAM_BATCH = 256  # chunks fetched, encoded and added per round
 
 def get_model():
     """Load the sentence transformer model (cached)"""
     global model
     if model is None:
         print("Loading MiniLM model...")
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        if torch.cuda.is_available():
+            # Half precision on GPU; CPU stays FP32
+            model = SentenceTransformer('all-MiniLM-L6-v2', device='cuda').half()
+        else:
+            # INT8 ONNX export when available, otherwise the PyTorch model
+            model = load_onnx_encoder() or SentenceTransformer('all-MiniLM-L6-v2')
         print("Model loaded successfully")
     return model
 
+def _index_mtime():
+    try:
+        return os.stat(FAISS_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
 def get_faiss_index():
-    """Load or create FAISS index"""
-    global faiss_index
-    if faiss_index is None:
-        index_path = pathlib.Path(FAISS_INDEX_PATH)
-        if index_path.exists():
+    """
+    Load or create FAISS index (an IndexIDMap2 whose ids are chunk ids)
+    Reloads when another process has replaced the file since it was loaded
+    """
+    global faiss_index, faiss_index_mtime
+    mtime = _index_mtime()
+    if faiss_index is None or mtime != faiss_index_mtime:
+        if mtime is not None:
             print("Loading existing FAISS index...")
-            faiss_index = faiss.read_index(str(index_path))
+            faiss_index = faiss.read_index(FAISS_INDEX_PATH)
+            faiss_index_mtime = mtime
             print(f"Loaded FAISS index with {faiss_index.ntotal} vectors")
+            if not is_id_mapped(faiss_index):
+                # Converted in memory; run() persists it and removes the mapping
+                faiss_index = migrate_legacy_index(faiss_index, FAISS_MAPPING_PATH)
+        elif faiss_index is not None:
+            return faiss_index  # not saved yet
         else:
             print("Creating new FAISS index...")
-            # Create index for 384-dimensional vectors (MiniLM output size)
-            faiss_index = faiss.IndexFlatIP(384)  # Inner Product for cosine similarity
+            # HNSW graph needs no training, so it serves small corpora until IVF-PQ can be trained
+            faiss_index = faiss.IndexIDMap2(
+                faiss.IndexHNSWFlat(EMBED_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT)  # Inner Product for cosine similarity
+            )
             print("Created new FAISS index")
+        configure_search(faiss_index)
     return faiss_index
 
-def get_faiss_mapping():
-    """Load or create FAISS ID to chunk ID mapping"""
-    mapping_path = pathlib.Path(FAISS_MAPPING_PATH)
-    if mapping_path.exists():
-        with open(mapping_path, 'rb') as f:
-            return pickle.load(f)
-    return {}
+def is_id_mapped(index) -> bool:
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+def configure_search(index):
+    """Apply query-time search parameters (IVF nprobe, HNSW efSearch) to an index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = FAISS_NPROBE
+    inner = faiss.downcast_index(index)
+    if is_id_mapped(inner):
+        inner = faiss.downcast_index(inner.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+def _reconstruct_all(index) -> np.ndarray:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
 
-def save_faiss_index_and_mapping(index, mapping):
-    """Save FAISS index and mapping to disk"""
+def migrate_legacy_index(index, mapping_path: str):
+    """
+    Convert an index written with sequential FAISS ids plus a pickled
+    FAISS id -> chunk id mapping into an IndexIDMap2 keyed by chunk id
+    """
+    with open(mapping_path, 'rb') as f:
+        mapping = pickle.load(f)
+    
+    positions = np.asarray(sorted(mapping), dtype=np.int64)
+    ids = np.asarray([mapping[p] for p in positions], dtype=np.int64)
+    vectors = _reconstruct_all(index)[positions]
+    
+    migrated = faiss.IndexIDMap2(faiss.IndexHNSWFlat(EMBED_DIM, HNSW_M, faiss.METRIC_INNER_PRODUCT))
+    migrated.add_with_ids(vectors, ids)
+    print(f"Migrated legacy FAISS index ({len(ids)} vectors) to chunk-id keys")
+    return configure_search(maybe_compress_index(migrated))
+
+def maybe_compress_index(index):
+    """
+    Rebuild an uncompressed (flat / HNSW) index as a trained IVF-PQ index
+    once it holds enough vectors to train the coarse quantizer
+    Vectors keep their chunk ids
+    """
+    if faiss.try_extract_index_ivf(index) is not None or index.ntotal < FAISS_TRAIN_MIN:
+        return index
+    
+    print(f"Training {FAISS_FACTORY} index on {index.ntotal} vectors...")
+    vectors = _reconstruct_all(index.index)
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    compressed = faiss.IndexIDMap2(faiss.index_factory(EMBED_DIM, FAISS_FACTORY, faiss.METRIC_INNER_PRODUCT))
+    compressed.train(vectors)
+    compressed.add_with_ids(vectors, ids)
+    print("FAISS index compressed")
+    return configure_search(compressed)
+
+@contextlib.contextmanager
+def index_lock():
+    """Exclusive lock serializing load-add-save of the index across workers"""
+    pathlib.Path(FAISS_INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{FAISS_INDEX_PATH}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def save_faiss_index(index):
+    """Save FAISS index to disk atomically (callers hold index_lock)"""
+    global faiss_index_mtime
     # Ensure directory exists
-    pathlib.Path("/data").mkdir(exist_ok=True)
+    pathlib.Path(FAISS_INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
     
-    # Save index
-    faiss.write_index(index, FAISS_INDEX_PATH)
+    # Readers only ever see a complete file: write aside, flush to disk, then rename over
+    tmp_path = f"{FAISS_INDEX_PATH}.tmp.{os.getpid()}"
+    try:
+        faiss.write_index(index, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, FAISS_INDEX_PATH)
+    finally:
+        pathlib.Path(tmp_path).unlink(missing_ok=True)
+    faiss_index_mtime = _index_mtime()
     
-    # Save mapping
-    with open(FAISS_MAPPING_PATH, 'wb') as f:
-        pickle.dump(mapping, f)
+    # Mapping from before chunk-id keys is obsolete once the converted index is on disk
+    pathlib.Path(FAISS_MAPPING_PATH).unlink(missing_ok=True)
     
-    print(f"Saved FAISS index with {index.ntotal} vectors and mapping")
+    print(f"Saved FAISS index with {index.ntotal} vectors")
 
 def run(document_id: int = None, chunk_id: int = None):
     """
@@ -69,95 +174,85 @@ def run(document_id: int = None, chunk_id: int = None):
         document_id: Process all chunks for this document (optional)
         chunk_id: Process specific chunk (optional)
     """
+    global faiss_index
     print(f"Starting embedding job - document_id: {document_id}, chunk_id: {chunk_id}")
     
-    db_url = os.getenv('DATABASE_URL', 'postgresql://postgres:password@db:5432/knowledge_hub')
-    engine = create_engine(db_url, pool_pre_ping=True)
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    # Engine and pool are shared by every job in this process
     session = SessionLocal()
+    added = []  # chunk ids per batch, to unmark if the index can't be saved
+    committed = False
     
     try:
-        # Load model and index
         model = get_model()
-        index = get_faiss_index()
-        mapping = get_faiss_mapping()
-        
-        # Get chunks to process
-        query = session.query(Chunk).filter(Chunk.embedding_vector_id.is_(None))
         
-        if document_id:
-            query = query.filter(Chunk.document_id == document_id)
-        elif chunk_id:
-            query = query.filter(Chunk.id == chunk_id)
+        # Hold the lock from load to save so concurrent workers don't drop each other's vectors
+        with index_lock():
+            # Load (or reload) the index
+            index = get_faiss_index()
         
-        chunks = query.all()
+            # Get chunks to process, streamed from a server-side cursor
+            query = select(Chunk.id, Chunk.text).where(Chunk.embedding_vector_id.is_(None)).order_by(Chunk.id)
         
-        if not chunks:
-            print("No chunks to embed")
-            return
+            if document_id:
+                query = query.where(Chunk.document_id == document_id)
+            elif chunk_id:
+                query = query.where(Chunk.id == chunk_id)
         
-        print(f"Processing {len(chunks)} chunks...")
+            rows = session.execute(query, execution_options={"yield_per": EMBED_STREAM_BATCH})
         
-        # Extract texts and generate embeddings
-        texts = [chunk.text for chunk in chunks]
-        embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            total = 0
+            for batch in rows.partitions():
+                ids = np.fromiter((row.id for row in batch), dtype=np.int64, count=len(batch))
+                # encode() already length-sorts within the call, so padding per batch stays small
+                embeddings = model.encode(
+                    [row.text for row in batch],
+                    batch_size=EMBED_BATCH,
+                    output_value='sentence_embedding',
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+            
+                # Add embeddings to FAISS index under their chunk ids
+                # fp16 output on GPU needs one conversion; FP32 output passes through uncopied
+                embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+                index.add_with_ids(embeddings, ids)
+                added.append(ids.tolist())
+                session.execute(
+                    update(Chunk).where(Chunk.id.in_(added[-1])).values(embedding_vector_id=Chunk.id)
+                )
+                total += len(batch)
         
-        # Add embeddings to FAISS index
-        start_idx = index.ntotal
-        index.add(embeddings.astype(np.float32))
+            if not total:
+                print("No chunks to embed")
+                return
         
-        # Update chunk records and mapping
-        for i, chunk in enumerate(chunks):
-            vector_id = start_idx + i
-            chunk.embedding_vector_id = vector_id
-            mapping[vector_id] = chunk.id
-            
-        session.commit()
+            faiss_index = index = maybe_compress_index(index)
         
-        # Save updated index and mapping
-        save_faiss_index_and_mapping(index, mapping)
+            # One commit once every batch is in the index, then persist it
+            session.commit()
+            committed = True
+            try:
+                save_faiss_index(index)
+            except Exception:
+                # The chunks are already marked embedded and would never be selected again;
+                # unmark them so the next run re-embeds them into the index reloaded from disk
+                for ids in added:
+                    session.execute(update(Chunk).where(Chunk.id.in_(ids)).values(embedding_vector_id=None))
+                session.commit()
+                committed = False
+                raise
         
-        print(f"Successfully embedded {len(chunks)} chunks. Total vectors in index: {index.ntotal}")
+            print(f"Successfully embedded {total} chunks. Total vectors in index: {index.ntotal}")
         
     except Exception as e:
         session.rollback()
+        if not committed:
+            # Nothing is marked embedded; drop vectors added before the failure, they'll be re-embedded on retry
+            faiss_index = None
+        # Otherwise the chunks are marked embedded but only the in-memory index has them;
+        # keep it so the next save writes them
         print(f"Error in embed_chunks job: {e}")
         raise
     finally:
         session.close()
-
-def search_similar_chunks(query_text: str, k: int = 5):
-    """
-    Search for similar chunks using FAISS
-    Args:
-        query_text: Text to search for
-        k: Number of results to return
-    Returns:
-        List of (chunk_id, similarity_score) tuples
-    """
-    try:
-        model = get_model()
-        index = get_faiss_index()
-        mapping = get_faiss_mapping()
-        
-        if index.ntotal == 0:
-            return []
-        
-        # Encode query
-        query_embedding = model.encode([query_text], convert_to_numpy=True, normalize_embeddings=True)
-        
-        # Search FAISS index
-        scores, indices = index.search(query_embedding.astype(np.float32), k)
-        
-        # Convert to chunk IDs
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx in mapping:
-                chunk_id = mapping[idx]
-                results.append((chunk_id, float(score)))
-        
-        return results
-        
-    except Exception as e:
-        print(f"Error in search_similar_chunks: {e}")
-        return []
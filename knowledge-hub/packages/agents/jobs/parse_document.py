@@ -1,8 +1,9 @@
-import os, pathlib
+import os, pathlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from packages.db.models import Document, Chunk
+from packages.db.database import SessionLocal
+from packages.db.models import Document
+from packages.db.bulk import bulk_insert_chunks
 
 # Optional token counter; fall back to char length
 try:
@@ -10,27 +11,72 @@ try:
     enc = tiktoken.get_encoding('cl100k_base')
     def count_tokens(text: str) -> int:
         return len(enc.encode(text))
+    def count_tokens_batch(texts: List[str]) -> List[int]:
+        return [len(ids) for ids in enc.encode_ordinary_batch(texts)]
 except Exception:
+    enc = None
     def count_tokens(text: str) -> int:
         return max(1, len(text)//4)  # rough estimate
+    def count_tokens_batch(texts: List[str]) -> List[int]:
+        return [count_tokens(t) for t in texts]
+
+# PDFs with at least this many pages are extracted in parallel; below it, pool start-up
+# and pickling the page text back cost more than the extraction itself
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '64'))
+PDF_WORKERS = min(8, os.cpu_count() or 4)
+
+# The worker process holds threads (log listener, torch/ONNX pools), so pool processes come
+# from a forkserver rather than forking it; the server imports this module once up front
+_PDF_MP_CONTEXT = multiprocessing.get_context('forkserver')
+_PDF_MP_CONTEXT.set_forkserver_preload([__name__])
+
+def _pdf_pages_text(path: str, start: int, stop: int) -> str:
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return "\n".join(doc.load_page(i).get_text("text", sort=False) for i in range(start, stop))
+
+def _extract_pdf(path: str) -> str:
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        n = doc.page_count
+    if n < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        return _pdf_pages_text(path, 0, n)
+    # PyMuPDF isn't thread-safe, so fan out across processes, each opening the file for a contiguous page range
+    step = -(-n // PDF_WORKERS)
+    starts = list(range(0, n, step))
+    with ProcessPoolExecutor(max_workers=len(starts), mp_context=_PDF_MP_CONTEXT) as ex:
+        parts = ex.map(_pdf_pages_text, [path] * len(starts), starts, [min(s + step, n) for s in starts])
+        return "\n".join(parts)
 
 # PDF/DOCX/TXT extractors
 def extract_text(path: str) -> str:
     p = pathlib.Path(path)
     if p.suffix.lower() == '.pdf':
-        import fitz  # PyMuPDF
-        with fitz.open(path) as doc:
-            return "\n".join(page.get_text("text") for page in doc)
+        return _extract_pdf(path)
     elif p.suffix.lower() == '.docx':
         import docx2txt
         return docx2txt.process(path) or ""
     elif p.suffix.lower() == '.txt':
-        return pathlib.Path(path).read_text(encoding='utf-8', errors='ignore')
+        # Plain decode; no universal-newline translation needed for chunking
+        return p.read_bytes().decode('utf-8', errors='ignore')
     else:
         return ""
 
-# Simple recursive chunker
+# Token-window chunker: one encode, then fixed-stride slices of the token ids
 def chunk_text(text: str, max_tokens: int = 800, overlap: int = 120) -> List[str]:
+    if enc is None:
+        return _chunk_words(text, max_tokens, overlap)
+    ids = enc.encode_ordinary(text)
+    stride = max(1, max_tokens - overlap)
+    chunks = []
+    for start in range(0, len(ids), stride):
+        chunks.append(enc.decode(ids[start:start + max_tokens]))
+        if start + max_tokens >= len(ids):
+            break
+    return [c.strip() for c in chunks if c.strip()]
+
+# Word-based fallback when tiktoken isn't available
+def _chunk_words(text: str, max_tokens: int, overlap: int) -> List[str]:
     words = text.split()
     chunks, chunk = [], []
     curr_tokens = 0
@@ -55,12 +101,10 @@ def chunk_text(text: str, max_tokens: int = 800, overlap: int = 120) -> List[str
 # Entrypoint for RQ
 def run(document_id: int, path: str, storage_dir: str):
     from sqlalchemy import text as sqltext
-    db_url = os.getenv('DATABASE_URL', 'postgresql://postgres:password@db:5432/knowledge_hub')
-    engine = create_engine(db_url, pool_pre_ping=True)
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    # Engine and pool are shared by every job in this process
     session = SessionLocal()
     try:
-        doc = session.query(Document).get(document_id)
+        doc = session.get(Document, document_id)
         if not doc:
             print(f"Document {document_id} not found")
             return
@@ -72,16 +116,19 @@ def run(document_id: int, path: str, storage_dir: str):
             return
         # Chunk
         pieces = chunk_text(raw, max_tokens=800, overlap=120)
-        # Insert chunks
-        for i, text in enumerate(pieces):
-            session.add(Chunk(document_id=document_id, chunk_index=i, text=text, token_count=count_tokens(text)))
+        # Insert chunks (COPY for large documents)
+        token_counts = count_tokens_batch(pieces)
+        bulk_insert_chunks(session, [
+            {"document_id": document_id, "chunk_index": i, "text": text, "token_count": n}
+            for i, (text, n) in enumerate(zip(pieces, token_counts))
+        ])
         doc.status = 'parsed'
         session.commit()
         print(f"Parsed {len(pieces)} chunks for document {document_id}")
     except Exception as e:
         session.rollback()
         try:
-            doc = session.query(Document).get(document_id)
+            doc = session.get(Document, document_id)
             if doc:
                 doc.status = 'error'
                 session.commit()
@@ -1,12 +1,15 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+from packages.db.database import SessionLocal
 from packages.db.models import Document, Chunk
 import httpx
 
 OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://ollama:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3')
 SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS','256'))
+OLLAMA_CONCURRENCY = int(os.getenv('OLLAMA_CONCURRENCY','4'))
+# Documents whose capped chunks total fewer chars than this are summarized in one call
+SUMMARY_DIRECT_CHAR_LIMIT = int(os.getenv('SUMMARY_DIRECT_CHAR_LIMIT','8000'))
 
 SYS = (
     "You write concise, faithful summaries using only the provided content. "
@@ -19,33 +22,48 @@ MERGE_PROMPT = (
     "Keep it factual and grounded.\n\n{summaries}"
 )
 
-def _ollama(prompt: str, max_tokens: int):
+async def _ollama(client: httpx.AsyncClient, prompt: str, max_tokens: int):
     payload = { 'model': OLLAMA_MODEL, 'prompt': prompt, 'stream': False, 'options': { 'num_predict': max_tokens } }
-    with httpx.Client(timeout=120) as client:
-        r = client.post(f"{OLLAMA_URL}/api/generate", json=payload)
-        r.raise_for_status()
-        return r.json().get('response','').strip()
+    r = await client.post(f"{OLLAMA_URL}/api/generate", json=payload)
+    r.raise_for_status()
+    return r.json().get('response','').strip()
+
+async def _sem_ollama(sem: asyncio.Semaphore, client: httpx.AsyncClient, prompt: str, max_tokens: int):
+    async with sem:
+        return await _ollama(client, prompt, max_tokens)
+
+async def _summarize_all(pieces):
+    """
+    Summarize small documents with a single call; otherwise map chunk summaries
+    concurrently (bounded by OLLAMA_CONCURRENCY), then merge
+    """
+    sem = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+    # Ollama speaks plain HTTP/1.1, so concurrency comes from parallel keep-alive connections
+    limits = httpx.Limits(max_connections=OLLAMA_CONCURRENCY, max_keepalive_connections=OLLAMA_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        if sum(len(p) for p in pieces) < SUMMARY_DIRECT_CHAR_LIMIT:
+            return await _ollama(client, f"<system>\n{SYS}\n</system>\n<user>\nSummarize:\n" + "\n\n".join(pieces) + "\n</user>", max_tokens=SUMMARY_MAX_TOKENS)
+        
+        summaries = await asyncio.gather(*[
+            _sem_ollama(sem, client, f"<system>\n{SYS}\n</system>\n<user>\n" + CHUNK_PROMPT.format(chunk=piece) + "\n</user>", 128)
+            for piece in pieces
+        ])
+        partial_summaries = [f"- {s}" for s in summaries if s]
+        return await _ollama(client, f"<system>\n{SYS}\n</system>\n<user>\n" + MERGE_PROMPT.format(summaries='\n'.join(partial_summaries)) + "\n</user>", max_tokens=SUMMARY_MAX_TOKENS)
 
 def run(document_id: int):
-    db_url = os.getenv('DATABASE_URL', 'postgresql+psycopg://hub:hub@db:5432/hub')
-    engine = create_engine(db_url, pool_pre_ping=True)
-    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-    session = Session()
+    # Engine and pool are shared by every job in this process
+    session = SessionLocal()
     try:
-        doc = session.query(Document).get(document_id)
+        doc = session.get(Document, document_id)
         if not doc:
             return
         chunks = session.query(Chunk).filter(Chunk.document_id==document_id).order_by(Chunk.chunk_index).all()
         if not chunks:
             return
-        # map: summarize chunks (cap to first N chars per chunk)
-        partial_summaries = []
-        for c in chunks[:20]:  # cap to 20 chunks for speed; tune later
-            piece = c.text[:1200]
-            s = _ollama(f"<system>\n{SYS}\n</system>\n<user>\n" + CHUNK_PROMPT.format(chunk=piece) + "\n</user>", max_tokens=128)
-            if s:
-                partial_summaries.append(f"- {s}")
-        merged = _ollama(f"<system>\n{SYS}\n</system>\n<user>\n" + MERGE_PROMPT.format(summaries='\n'.join(partial_summaries)) + "\n</user>", max_tokens=SUMMARY_MAX_TOKENS)
+        # map: summarize chunks (cap to first N chars per chunk), then reduce
+        pieces = [c.text[:1200] for c in chunks[:20]]  # cap to 20 chunks for speed; tune later
+        merged = asyncio.run(_summarize_all(pieces))
         doc.summary = merged[:4000]
         session.commit()
     finally:
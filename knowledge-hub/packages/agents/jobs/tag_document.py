@@ -1,6 +1,9 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import re
+import json
+import atexit
+from sqlalchemy import insert
+from packages.db.database import SessionLocal
 from packages.db.models import Document, Chunk, DocumentTag
 import httpx
 
@@ -8,6 +11,12 @@ OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://ollama:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3')
 TAG_LABELS = [s.strip() for s in os.getenv('TAG_LABELS','').split(',') if s.strip()]
 MAX_CTX = int(os.getenv('TAG_CTX_CHARS', '6000'))
+# Brackets, quotes and whitespace around a tag in the comma-split fallback
+_STRIP = re.compile(r'^[\s\[\]"\']+|[\s\[\]"\']+$')
+
+# One client per worker process so tagging jobs reuse kept-alive connections
+_CLIENT = httpx.Client(timeout=120, limits=httpx.Limits(max_keepalive_connections=8))
+atexit.register(_CLIENT.close)
 
 SYSTEM = (
     "You assign concise topic tags to documents using the provided labels only. "
@@ -32,12 +41,10 @@ def _concat_context(chunks):
     return "\n\n".join(buf)
 
 def run(document_id: int):
-    db_url = os.getenv('DATABASE_URL', 'postgresql+psycopg://hub:hub@db:5432/hub')
-    engine = create_engine(db_url, pool_pre_ping=True)
-    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-    session = Session()
+    # Engine and pool are shared by every job in this process
+    session = SessionLocal()
     try:
-        doc = session.query(Document).get(document_id)
+        doc = session.get(Document, document_id)
         if not doc:
             return
         chunks = session.query(Chunk).filter(Chunk.document_id==document_id).order_by(Chunk.chunk_index).all()
@@ -50,12 +57,10 @@ def run(document_id: int):
             'stream': False,
             'options': { 'num_predict': 128 }
         }
-        with httpx.Client(timeout=120) as client:
-            r = client.post(f"{OLLAMA_URL}/api/generate", json=payload)
-            r.raise_for_status()
-            text = r.json().get('response','[]').strip()
+        r = _CLIENT.post(f"{OLLAMA_URL}/api/generate", json=payload)
+        r.raise_for_status()
+        text = r.json().get('response','[]').strip()
         # naive JSON parse
-        import json
         tags = []
         try:
             tags = json.loads(text)
@@ -63,12 +68,12 @@ def run(document_id: int):
                 tags = []
         except Exception:
             # fallback: split by commas
-            tags = [t.strip().strip('[]"\'') for t in text.split(',') if t.strip()]
+            tags = [_STRIP.sub('', t) for t in text.split(',') if t.strip()]
         # clear old tags
         session.query(DocumentTag).filter(DocumentTag.document_id==document_id).delete()
-        for t in tags[:4]:
-            if t:
-                session.add(DocumentTag(document_id=document_id, tag=str(t)[:128]))
+        rows = [{'document_id': document_id, 'tag': str(t)[:128]} for t in tags[:4] if t]
+        if rows:
+            session.execute(insert(DocumentTag), rows)
         session.commit()
     finally:
         session.close()
\ No newline at end of file
@@ -10,11 +10,13 @@ import logging
 import os
 import pathlib
 from typing import Dict, List, Optional, Union, Any
-import aiofiles
 import json
 
 logger = logging.getLogger(__name__)
 
+# Files above this size are read/written in pieces so one call doesn't hold a worker thread for long
+LARGE_FILE_BYTES = 16 * 1024 * 1024
+
 class FileTool:
     """
     MCP File Tool for file operations
@@ -32,6 +34,7 @@ class FileTool:
         """
         self.base_path = pathlib.Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self._resolved_base = self.base_path.resolve()
         logger.info(f"FileTool initialized with base path: {self.base_path}")
     
     def _validate_path(self, file_path: str) -> pathlib.Path:
@@ -48,16 +51,18 @@ class FileTool:
             ValueError: If path is outside base directory
         """
         try:
-            # Convert to Path object and resolve
-            path = pathlib.Path(file_path)
+            # Reject the obvious escapes without touching the filesystem
+            path = pathlib.PurePosixPath(file_path)
             if path.is_absolute():
                 raise ValueError("Absolute paths are not allowed")
+            if ".." in path.parts:
+                raise ValueError("Parent directory references are not allowed")
             
-            # Resolve within base path
-            full_path = (self.base_path / path).resolve()
+            # Resolve within base path (follows symlinks that could point outside it)
+            full_path = (self._resolved_base / path).resolve()
             
-            # Ensure path is within base directory
-            if not str(full_path).startswith(str(self.base_path.resolve())):
+            # Ensure path is within base directory; component-wise, so /app/data_evil doesn't match /app/data
+            if not full_path.is_relative_to(self._resolved_base):
                 raise ValueError("Path outside base directory not allowed")
                 
             return full_path
@@ -86,12 +91,14 @@ class FileTool:
                     "content": None
                 }
             
-            async with aiofiles.open(validated_path, 'r', encoding=encoding) as file:
-                content = await file.read()
-            
             # Get file stats
             stat = validated_path.stat()
             
+            if stat.st_size > LARGE_FILE_BYTES:
+                content = await self._read_chunked(validated_path, encoding)
+            else:
+                content = await asyncio.to_thread(validated_path.read_text, encoding=encoding)
+            
             return {
                 "success": True,
                 "content": content,
@@ -129,8 +136,10 @@ class FileTool:
             # Create parent directories if they don't exist
             validated_path.parent.mkdir(parents=True, exist_ok=True)
             
-            async with aiofiles.open(validated_path, 'w', encoding=encoding) as file:
-                await file.write(content)
+            if len(content) > LARGE_FILE_BYTES:
+                await self._write_chunked(validated_path, content, encoding)
+            else:
+                await asyncio.to_thread(validated_path.write_text, content, encoding=encoding, errors="strict")
             
             # Get file stats after writing
             stat = validated_path.stat()
@@ -153,6 +162,26 @@ class FileTool:
                 "error": str(e)
             }
     
+    @staticmethod
+    async def _read_chunked(path: pathlib.Path, encoding: str) -> str:
+        file = await asyncio.to_thread(open, path, "r", encoding=encoding)
+        try:
+            parts = []
+            while part := await asyncio.to_thread(file.read, LARGE_FILE_BYTES):
+                parts.append(part)
+            return "".join(parts)
+        finally:
+            await asyncio.to_thread(file.close)
+    
+    @staticmethod
+    async def _write_chunked(path: pathlib.Path, content: str, encoding: str) -> None:
+        file = await asyncio.to_thread(open, path, "w", encoding=encoding, errors="strict")
+        try:
+            for start in range(0, len(content), LARGE_FILE_BYTES):
+                await asyncio.to_thread(file.write, content[start:start + LARGE_FILE_BYTES])
+        finally:
+            await asyncio.to_thread(file.close)
+    
     async def list_files(self, directory_path: str = "") -> Dict[str, Any]:
         """
         List files in directory
@@ -167,7 +196,7 @@ class FileTool:
             if directory_path:
                 validated_path = self._validate_path(directory_path)
             else:
-                validated_path = self.base_path
+                validated_path = self._resolved_base
             
             if not validated_path.exists():
                 return {
@@ -183,18 +212,21 @@ class FileTool:
                     "files": []
                 }
             
+            # One scandir pass: entry type comes from the directory listing and stat() is cached per entry
+            relative_dir = validated_path.relative_to(self._resolved_base)
             files = []
-            for item in validated_path.iterdir():
-                relative_path = item.relative_to(self.base_path)
-                stat = item.stat()
-                
-                files.append({
-                    "name": item.name,
-                    "path": str(relative_path),
-                    "type": "directory" if item.is_dir() else "file",
-                    "size": stat.st_size if item.is_file() else None,
-                    "modified": stat.st_mtime
-                })
+            with os.scandir(validated_path) as entries:
+                for entry in entries:
+                    stat = entry.stat(follow_symlinks=False)
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    
+                    files.append({
+                        "name": entry.name,
+                        "path": str(relative_dir / entry.name),
+                        "type": "directory" if is_dir else "file",
+                        "size": None if is_dir else stat.st_size,
+                        "modified": stat.st_mtime
+                    })
             
             return {
                 "success": True,
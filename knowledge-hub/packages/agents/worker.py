@@ -7,14 +7,52 @@ Currently implements a simple infinite loop for basic functionality.
 """
 
 import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
 from redis import Redis
-from rq import Worker, Queue, Connection
+from rq import Queue
+from rq.worker import SimpleWorker
+from packages.agents.config import WorkerConfig
 
 listen = ['default']
 redis_url = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 conn = Redis.from_url(redis_url)
+# Exit after this many jobs so the container restarts with a fresh heap
+max_jobs = int(os.getenv('WORKER_MAX_JOBS', '1000'))
+
+def setup_logging():
+    """
+    Log through a queue so job code never waits on stdout/file writes;
+    a listener thread in this process does the writing
+    """
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if WorkerConfig.LOG_FILE and os.path.isdir(os.path.dirname(WorkerConfig.LOG_FILE) or "."):
+        # delay=True: the file isn't opened until the first record reaches it
+        handlers.append(logging.handlers.RotatingFileHandler(
+            WorkerConfig.LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=3, delay=True
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(WorkerConfig.LOG_LEVEL.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Forked children don't inherit the listener thread; log directly from there
+    os.register_at_fork(after_in_child=lambda: setattr(root, 'handlers', handlers))
 
 if __name__ == '__main__':
-    with Connection(conn):
-        worker = Worker(list(map(Queue, listen)))
-        worker.work(with_scheduler=True)
+    setup_logging()
+    # SimpleWorker runs jobs in this process: no fork per job, and the loaded
+    # models and FAISS index stay warm between jobs
+    worker = SimpleWorker([Queue(name, connection=conn) for name in listen], connection=conn)
+    worker.work(with_scheduler=True, max_jobs=max_jobs, logging_level=WorkerConfig.LOG_LEVEL.upper())
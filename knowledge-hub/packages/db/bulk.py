@@ -0,0 +1,46 @@
+"""
+Bulk write helpers for the ingestion pipeline
+"""
+
+import csv
+import io
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .models import Chunk
+
+# Below this many rows a multi-row INSERT is cheaper than setting up a COPY
+COPY_MIN_ROWS = 100
+
+CHUNK_COLUMNS = ("document_id", "chunk_index", "text", "token_count")
+
+def bulk_insert_chunks(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert chunk rows within the session's current transaction
+
+    Args:
+        session: Open SQLAlchemy session (caller commits)
+        rows: Dicts with document_id, chunk_index, text and token_count
+    """
+    if len(rows) < COPY_MIN_ROWS:
+        if rows:
+            # executemany through Core; no ORM objects or unit-of-work flush
+            session.execute(insert(Chunk), rows)
+        return
+
+    # QUOTE_NONNUMERIC keeps empty strings distinct from NULL in CSV COPY
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([row[col] for col in CHUNK_COLUMNS])
+    buf.seek(0)
+
+    # Raw psycopg2 connection, bound to the same transaction as the session
+    dbapi_conn = session.connection().connection
+    with dbapi_conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY chunks ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT CSV)",
+            buf,
+        )
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, DateTime, Integer, Text, ForeignKey, func
+from sqlalchemy import String, DateTime, Integer, Text, ForeignKey, Index, CheckConstraint, func, text
 
 class Base(DeclarativeBase):
     pass
@@ -10,17 +10,28 @@ class User(Base):
     email: Mapped[str] = mapped_column(String(320), unique=True, index=True)
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+DOCUMENT_STATUSES = ("uploaded", "parsed", "parsed_empty", "error")
+
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        CheckConstraint(f"status IN {DOCUMENT_STATUSES}", name="ck_documents_status"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    filename: Mapped[str] = mapped_column(String)
-    mime: Mapped[str] = mapped_column(String, default="application/octet-stream")
-    status: Mapped[str] = mapped_column(String, default="uploaded")
+    filename: Mapped[str] = mapped_column(String(512))
+    mime: Mapped[str] = mapped_column(String(128), default="application/octet-stream")
+    status: Mapped[str] = mapped_column(String(16), default="uploaded")
     summary: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 class Chunk(Base):
     __tablename__ = "chunks"
+    __table_args__ = (
+        # Ordered chunks of a document (also serves per-document counts)
+        Index("ix_chunks_doc_idx", "document_id", "chunk_index", unique=True),
+        # Chunks still waiting for the embedding job, in id order
+        Index("ix_chunks_pending_embed", "document_id", "id", postgresql_where=text("embedding_vector_id IS NULL")),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
     chunk_index: Mapped[int] = mapped_column(Integer)